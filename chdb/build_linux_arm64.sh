@@ -46,7 +46,7 @@ for PY_VER in ${PYTHON_VERSIONS}; do
 
     find dist
 
-    python3 -m pip install pandas pyarrow psutil
+    python3 -m pip install pandas pyarrow psutil numpy numba google-re2
     find dist
     whl_file=$(find dist | grep 'whl$' | grep cp${PY_VER//./}-cp${PY_VER//./})
     python3 -m pip install --force-reinstall ${whl_file}
@@ -199,19 +199,12 @@ class CHDBResult(object):
 
         try:
             self.field_count = len(data["meta"])
-            description = []
-            for meta in data["meta"]:
-                fields = [meta["name"], meta["type"]]
-                description.append(tuple(fields))
-            self.description = tuple(description)
-
-            rows = []
-            for line in data["data"]:
-                row = []
-                for i in range(self.field_count):
-                    column_data = converters.convert_column_data(self.description[i][1], line[self.description[i][0]])
-                    row.append(column_data)
-                rows.append(tuple(row))
-            self.rows = tuple(rows)
+            description = self.description = tuple(
+                [(meta["name"], meta["type"]) for meta in data["meta"]])
+
+            convert = converters.convert_column_data
+            self.rows = tuple([
+                tuple([convert(type_, line[name]) for name, type_ in description])
+                for line in data["data"]])
         except Exception as error:
             raise err.InterfaceError("Read return data err:" % error)
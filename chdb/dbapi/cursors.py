@@ -1,14 +1,88 @@
 from . import err
+from functools import lru_cache
+from itertools import chain, islice
 import re
 
+try:
+    # RE2 matches in linear time, so large or pathological queries can't
+    # make executemany backtrack. It has no \Z, only \z.
+    import re2 as _re_engine
+    _END = r"\z"
+except ImportError:
+    _re_engine = re
+    _END = r"\Z"
+
 # Regular expression for :meth:`Cursor.executemany`.
 # executemany only supports simple bulk insert.
 # You can use it to load large dataset.
-RE_INSERT_VALUES = re.compile(
-    r"\s*((?:INSERT|REPLACE)\b.+\bVALUES?\s*)" +
+# Flags are inline (IGNORECASE, DOTALL) so the pattern compiles on both re and re2.
+RE_INSERT_VALUES = _re_engine.compile(
+    r"(?is)\s*((?:INSERT|REPLACE)\b.+\bVALUES?\s*)" +
     r"(\(\s*(?:%s|%\(.+\)s)\s*(?:,\s*(?:%s|%\(.+\)s)\s*)*\))" +
-    r"(\s*(?:ON DUPLICATE.*)?);?\s*\Z",
-    re.IGNORECASE | re.DOTALL)
+    r"(\s*(?:ON DUPLICATE.*)?);?\s*" + _END)
+
+
+# Row separator of the statements built by executemany. Every encoding a
+# connection uses must be ASCII compatible for this to hold.
+_COMMA = b','
+
+
+@lru_cache(maxsize=128)
+def _parse_insert(query, encoding):
+    """Split a bulk INSERT/REPLACE query into (prefix, values, postfix).
+
+    prefix and postfix are pre-encoded to bytes. Returns None if the query
+    is not supported by the :meth:`Cursor.executemany` fast path.
+    """
+    m = RE_INSERT_VALUES.match(query)
+    if not m:
+        return None
+    q_prefix = m.group(1) % ()
+    q_values = m.group(2).rstrip()
+    q_postfix = m.group(3) or ''
+    assert q_values[0] == '(' and q_values[-1] == ')'
+    assert ','.encode(encoding) == _COMMA
+    return q_prefix.encode(encoding), q_values, q_postfix.encode(encoding)
+
+
+RE_VALUES_PLACEHOLDER = re.compile(r"%(?:\(([^)]*)\))?s")
+
+
+@lru_cache(maxsize=128)
+def _compile_values(values):
+    """Generate a formatter equivalent to ``values % escaped_row``.
+
+    The placeholder layout of a values template is fixed, so the generated
+    ``fmt(row, escape)`` indexes the row and builds the string in a single
+    f-string instead of going through the ``%`` parser for every row.
+    Returns ``(fmt, named)``, or None if the template can't be compiled.
+    """
+    pieces = RE_VALUES_PLACEHOLDER.split(values)
+    literals, names = pieces[0::2], pieces[1::2]
+    if any('%' in lit for lit in literals):
+        return None
+    named = names[0] is not None
+    if any((name is not None) != named for name in names):
+        return None
+
+    ns = {}
+    body = [literals[0].replace('{', '{{').replace('}', '}}')]
+    for i, (name, lit) in enumerate(zip(names, literals[1:])):
+        if named:
+            ns['k%d' % i] = name
+            body.append('{e(row[k%d])}' % i)
+        else:
+            body.append('{e(row[%d])}' % i)
+        body.append(lit.replace('{', '{{').replace('}', '}}'))
+    src = 'def fmt(row, e):\n'
+    if not named:
+        # Keep the TypeError raised by % on a row of the wrong length.
+        src += ('    if len(row) != %d:\n'
+                '        raise TypeError("row has %%d items, expected %d"'
+                ' %% len(row))\n' % (len(names), len(names)))
+    src += '    return f%s\n' % repr(''.join(body))
+    exec(src, ns)
+    return ns['fmt'], named
 
 
 class Cursor(object):
@@ -27,8 +101,23 @@ class Cursor(object):
     #: Default value is 1024000.
     max_stmt_length = 1024000
 
+    # Set on the classes made by _unchecked_class() to the class they were
+    # derived from; None on regular cursor classes.
+    _checked_class = None
+
+    #: Let :meth:`executemany` format rows made only of integers with a
+    #: numba compiled builder. Requires numpy and numba
+    #: (``pip install chdb[numba]``).
+    #:
+    #: Default value is False.
+    use_numba = False
+
     def __init__(self, connection):
         self.connection = connection
+        # Cached to avoid going through the connection for every row
+        # in executemany; reset by close().
+        self._escape = connection.escape
+        self._encoding = connection.encoding
         self.description = None
         self.rowcount = -1
         self.rownumber = 0
@@ -46,7 +135,19 @@ class Cursor(object):
         self.close()
 
     def __iter__(self):
-        return iter(self.fetchone, None)
+        if type(self).fetchone not in (Cursor.fetchone, Cursor._fetchone):
+            yield from iter(self.fetchone, None)
+            return
+        # Walk the buffered rows directly instead of calling fetchone() per
+        # row; rownumber moves one row per yield so fetch* can be mixed in.
+        self._check_executed()
+        while True:
+            rows = self._rows
+            if rows is None or self.rownumber >= len(rows):
+                return
+            row = rows[self.rownumber]
+            self.rownumber += 1
+            yield row
 
     def callproc(self, procname, args=()):
         """Execute stored procedure procname with args
@@ -91,21 +192,27 @@ class Cursor(object):
                 pass
         finally:
             self.connection = None
+            self._escape = None
+            self._encoding = None
+            self._executed = None
+            if self._checked_class is not None:
+                self.__class__ = self._checked_class
 
     def _get_db(self):
         if not self.connection:
             raise err.ProgrammingError("Cursor closed")
         return self.connection
 
-    def _escape_args(self, args, conn):
+    def _escape_args(self, args):
+        escape = self._escape
         if isinstance(args, (tuple, list)):
-            return tuple(conn.escape(arg) for arg in args)
+            return tuple([escape(arg) for arg in args])
         elif isinstance(args, dict):
-            return {key: conn.escape(val) for (key, val) in args.items()}
+            return {key: escape(val) for (key, val) in args.items()}
         else:
             # If it's not a dictionary let's try escaping it anyway.
             # Worst case it will throw a Value error
-            return conn.escape(args)
+            return escape(args)
 
     def mogrify(self, query, args=None):
         """
@@ -114,10 +221,14 @@ class Cursor(object):
 
         This method follows the extension to the DB API 2.0 followed by Psycopg.
         """
-        conn = self._get_db()
+        self._get_db()
 
         if args is not None:
-            query = query % self._escape_args(args, conn)
+            # Formatting a str query without any % with empty args is a no-op
+            if (not args and isinstance(args, (tuple, list, dict))
+                    and isinstance(query, str) and '%' not in query):
+                return query
+            query = query % self._escape_args(args)
 
         return query
 
@@ -131,7 +242,8 @@ class Cursor(object):
         self._rows = None
 
     def _do_get_result(self):
-        conn = self._get_db()
+        # Only called by _query(), which has checked the connection
+        conn = self.connection
 
         self._result = result = conn._result
 
@@ -140,8 +252,10 @@ class Cursor(object):
         self.lastrowid = result.insert_id
         self._rows = result.rows
 
-    def _query(self, q):
-        conn = self._get_db()
+    def _query(self, q, conn=None):
+        # executemany() passes the connection it checked once for all flushes
+        if conn is None:
+            conn = self._get_db()
         self._last_executed = q
         self._clear_result()
         conn.query(q)
@@ -167,8 +281,14 @@ class Cursor(object):
 
         query = self.mogrify(query, args)
 
-        result = self._query(query)
+        return self._execute(query)
+
+    def _execute(self, query, conn=None):
+        result = self._query(query, conn)
         self._executed = query
+        if query and self._checked_class is None:
+            # fetch* can't fail the executed check from now on
+            self.__class__ = _unchecked_class(type(self))
         return result
 
     def executemany(self, query, args):
@@ -186,47 +306,98 @@ class Cursor(object):
         if not args:
             return 0
 
-        m = RE_INSERT_VALUES.match(query)
-        if m:
-            q_prefix = m.group(1) % ()
-            q_values = m.group(2).rstrip()
-            q_postfix = m.group(3) or ''
-            assert q_values[0] == '(' and q_values[-1] == ')'
-            return self._do_execute_many(q_prefix, q_values, q_postfix, args,
-                                         self.max_stmt_length,
-                                         self._get_db().encoding)
+        if self._escape is None:
+            raise err.ProgrammingError("Cursor closed")
+        encoding = self._encoding
+        # Cheap prefilter so UPDATE/DELETE/... never reach the regex.
+        if query.lstrip()[:7].upper().startswith(('INSERT', 'REPLACE')):
+            parsed = _parse_insert(query, encoding)
+        else:
+            parsed = None
+        if parsed:
+            prefix, values, postfix = parsed
+            return self._do_execute_many(prefix, values, postfix, args,
+                                         self.max_stmt_length, encoding)
 
         self.rowcount = sum(self.execute(query, arg) for arg in args)
         return self.rowcount
 
     def _do_execute_many(self, prefix, values, postfix, args, max_stmt_length, encoding):
-        conn = self._get_db()
-        escape = self._escape_args
-        if isinstance(prefix, str):
-            prefix = prefix.encode(encoding)
-        if isinstance(postfix, str):
-            postfix = postfix.encode(encoding)
-        sql = prefix
-        args = iter(args)
-        v = values % escape(next(args), conn)
-        if isinstance(v, str):
-            v = v.encode(encoding, 'surrogateescape')
-        sql += v
+        # executemany() has checked the cursor is open; flushes reuse conn
+        conn = self.connection
+        escape = self._escape
+        rest = iter(args)
+        compiled = _compile_values(values)
         rows = 0
-        for arg in args:
-            v = values % escape(arg, conn)
-            if isinstance(v, str):
-                v = v.encode(encoding, 'surrogateescape')
-            if len(sql) + len(v) + len(postfix) + 1 > max_stmt_length:
-                rows += self.execute(sql + postfix)
-                sql = prefix
+        if self.use_numba and compiled and not compiled[1]:
+            rows, rest = self._do_execute_many_int(prefix, postfix, rest,
+                                                   values.count('%s'), max_stmt_length)
+        # Rows of the shape the template expects go through the generated
+        # formatter; anything else (e.g. a bare str) takes the generic %
+        # path so it fails or formats exactly as execute() would.
+        if compiled:
+            fmt = compiled[0]
+            row_type = dict if compiled[1] else (tuple, list)
+        else:
+            fmt = None
+            row_type = ()
+        # Collect the rows of a batch and join them once per statement;
+        # ``bytes += bytes`` copies the whole statement on every row.
+        batch = []
+        # Running length of the batch with one comma counted per row, so
+        # appending v gives joined rows of exactly ``size + len(v)`` bytes.
+        size = 0
+        limit = max_stmt_length - len(prefix) - len(postfix)
+        for arg in rest:
+            if isinstance(arg, row_type):
+                v = fmt(arg, escape)
             else:
-                sql += ','.encode(encoding)
-            sql += v
-        rows += self.execute(sql + postfix)
+                v = values % self._escape_args(arg)
+            # values is a str template, so every formatted row is a str.
+            v = v.encode(encoding, 'surrogateescape')
+            vlen = len(v)
+            # The first row of a batch always goes in, even if oversized.
+            if size + vlen > limit and batch:
+                rows += self._execute(prefix + _COMMA.join(batch) + postfix, conn)
+                batch.clear()
+                size = 0
+            batch.append(v)
+            size += 1 + vlen
+        if batch:
+            rows += self._execute(prefix + _COMMA.join(batch) + postfix, conn)
         self.rowcount = rows
         return rows
 
+    def _do_execute_many_int(self, prefix, postfix, args, n_cols, max_stmt_length):
+        """Insert the leading all-integer rows of args with the numba row
+        writer in :mod:`.numeric`.
+
+        Returns the number of affected rows and an iterator over the rows
+        left for the generic path, starting at the first chunk that isn't
+        made only of integers.
+        """
+        from . import numeric
+        conn = self.connection
+        limit = max_stmt_length - len(prefix) - len(postfix)
+        writer = numeric.IntRowWriter(n_cols, limit)
+        # Convert about one statement worth of values at a time
+        chunk_size = max(limit // (8 * n_cols), 1)
+        rows = 0
+        while True:
+            chunk = list(islice(args, chunk_size))
+            if not chunk:
+                break
+            matrix = numeric.int_matrix(chunk, n_cols)
+            if matrix is None:
+                args = chain(chunk, args)
+                break
+            for data in writer.write(matrix):
+                rows += self._execute(prefix + data + postfix, conn)
+        data = writer.flush()
+        if data:
+            rows += self._execute(prefix + data + postfix, conn)
+        return rows, args
+
     def _check_executed(self):
         if not self._executed:
             raise err.ProgrammingError("execute() first")
@@ -234,15 +405,26 @@ class Cursor(object):
     def fetchone(self):
         """Fetch the next row"""
         self._check_executed()
+        return self._fetchone()
+
+    def fetchmany(self, size=None):
+        """Fetch several rows"""
+        self._check_executed()
+        return self._fetchmany(size)
+
+    def fetchall(self):
+        """Fetch all the rows"""
+        self._check_executed()
+        return self._fetchall()
+
+    def _fetchone(self):
         if self._rows is None or self.rownumber >= len(self._rows):
             return None
         result = self._rows[self.rownumber]
         self.rownumber += 1
         return result
 
-    def fetchmany(self, size=None):
-        """Fetch several rows"""
-        self._check_executed()
+    def _fetchmany(self, size=None):
         if self._rows is None:
             return ()
         end = self.rownumber + (size or self.arraysize)
@@ -250,9 +432,7 @@ class Cursor(object):
         self.rownumber = min(end, len(self._rows))
         return result
 
-    def fetchall(self):
-        """Fetch all the rows"""
-        self._check_executed()
+    def _fetchall(self):
         if self._rows is None:
             return ()
         if self.rownumber:
@@ -274,6 +454,25 @@ class Cursor(object):
         """Does nothing, required by DB API."""
 
 
+@lru_cache(maxsize=None)
+def _unchecked_class(cls):
+    """Return a subclass of cls whose fetch methods skip _check_executed().
+
+    A cursor switches to it after its first execute() and back on close().
+    Fetch methods overridden by cls are kept.
+    """
+    ns = {
+        '__module__': cls.__module__,
+        '__qualname__': cls.__qualname__,
+        '__doc__': cls.__doc__,
+        '_checked_class': cls,
+    }
+    for name in ('fetchone', 'fetchmany', 'fetchall'):
+        if getattr(cls, name) is getattr(Cursor, name):
+            ns[name] = getattr(Cursor, '_' + name)
+    return type(cls.__name__, (cls,), ns)
+
+
 class DictCursor(Cursor):
     """A cursor which returns results as a dictionary"""
     # You can override this to use OrderedDict or other dict-like types.
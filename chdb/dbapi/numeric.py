@@ -0,0 +1,94 @@
+"""Numba compiled row formatting for :meth:`Cursor.executemany`.
+
+Used when :attr:`Cursor.use_numba` is set. Requires numpy and numba,
+see the ``numba`` extra.
+"""
+import numpy as np
+from numba import njit
+
+_INT64_MIN = np.iinfo(np.int64).min
+
+
+def int_matrix(rows, n_cols):
+    """Return rows as a 2D int64 array, or None if they aren't all integers."""
+    try:
+        matrix = np.asarray(rows)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    if matrix.ndim != 2 or matrix.shape[1] != n_cols or matrix.dtype.kind != 'i':
+        return None
+    matrix = matrix.astype(np.int64, copy=False)
+    # -INT64_MIN doesn't fit in int64, leave it to the generic path
+    if matrix.min() == _INT64_MIN:
+        return None
+    return matrix
+
+
+@njit(cache=True)
+def _write_int_rows(matrix, start, buf, pos, limit):
+    n_rows, n_cols = matrix.shape
+    digits = np.empty(20, dtype=np.uint8)
+    for i in range(start, n_rows):
+        if pos >= limit and pos:
+            return pos, i
+        row_start = pos
+        if pos:
+            buf[pos] = 44  # ','
+            pos += 1
+        buf[pos] = 40  # '('
+        pos += 1
+        for j in range(n_cols):
+            if j:
+                buf[pos] = 44  # ','
+                pos += 1
+            x = matrix[i, j]
+            if x < 0:
+                buf[pos] = 45  # '-'
+                pos += 1
+                x = -x
+            n = 0
+            while True:
+                digits[n] = 48 + x % 10
+                x //= 10
+                n += 1
+                if x == 0:
+                    break
+            for k in range(n - 1, -1, -1):
+                buf[pos] = digits[k]
+                pos += 1
+        buf[pos] = 41  # ')'
+        pos += 1
+        # The first row of a statement always goes in, even if oversized.
+        if pos > limit and row_start:
+            return row_start, i
+    return pos, n_rows
+
+
+class IntRowWriter(object):
+    """Format int64 rows into ``(..),(..)`` lists of at most limit bytes.
+
+    Only one statement is buffered at a time, whatever the number of rows.
+    """
+
+    def __init__(self, n_cols, limit):
+        self.limit = limit
+        # Room for one more row (sign + 19 digits per value, separators)
+        # past the limit before it gets rolled back.
+        self.buf = np.empty(max(limit, 0) + n_cols * 21 + 3, dtype=np.uint8)
+        self.pos = 0
+
+    def write(self, matrix):
+        """Add the rows of matrix, yielding each statement body that fills up."""
+        start = 0
+        n_rows = len(matrix)
+        while start < n_rows:
+            self.pos, start = _write_int_rows(
+                matrix, start, self.buf, self.pos, self.limit)
+            if start < n_rows:
+                yield self.flush()
+
+    def flush(self):
+        """Return the buffered rows and start a new statement."""
+        data = self.buf[:self.pos].tobytes()
+        self.pos = 0
+        return data
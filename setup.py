@@ -199,6 +199,7 @@ if __name__ == "__main__":
             exclude_package_data={'': ['*.pyc', 'src/**']},
             ext_modules=ext_modules,
             python_requires='>=3.8',
+            extras_require={'numba': ['numpy', 'numba']},
             cmdclass={'build_ext': BuildExt},
             test_suite="tests",
             zip_safe=False,
@@ -1,7 +1,21 @@
 #!/usr/bin/env python3
 
+import itertools
 import unittest
 from chdb import dbapi
+from chdb.dbapi import cursors
+
+try:
+    import numba  # noqa: F401
+    has_numba = True
+except ImportError:
+    has_numba = False
+
+try:
+    import re2  # noqa: F401
+    has_re2 = True
+except ImportError:
+    has_re2 = False
 
 # version should be string split by '.'
 # eg. '0.12.0' or '0.12.0rc1' or '0.12.0beta1' or '0.12.0alpha1' or '0.12.0a1'
@@ -63,10 +77,141 @@ class TestDBAPI(unittest.TestCase):
         rows = cur.fetchall()
         self.assertEqual(rows, ((96,), (72,), (24,)))
 
+        # Test iteration
+        cur.execute("SELECT value FROM rate ORDER BY day DESC")
+        self.assertEqual(list(cur), [(96,), (72,), (24,)])
+
         # Clean up
+        cur.close()
+        self.assertIs(type(cur), cursors.Cursor)
+        with self.assertRaises(dbapi.err.ProgrammingError):
+            cur.fetchone()
+        conn.close()
+
+    def test_iterate_with_fetch(self):
+        conn = dbapi.connect()
+        cur = conn.cursor()
+
+        # Leaving a loop early doesn't skip rows
+        cur.execute("SELECT toInt32(number) FROM numbers(5)")
+        for row in cur:
+            self.assertEqual(row, (0,))
+            break
+        self.assertEqual(cur.fetchall(), ((1,), (2,), (3,), (4,)))
+
+        # fetchone() inside the loop takes the next row
+        cur.execute("SELECT toInt32(number) FROM numbers(5)")
+        pairs = [(row, cur.fetchone()) for row in cur]
+        self.assertEqual(pairs, [((0,), (1,)), ((2,), (3,)), ((4,), None)])
+
         cur.close()
         conn.close()
 
+    def test_executemany_batches(self):
+        conn = dbapi.connect()
+        cur = conn.cursor()
+        cur.execute("CREATE DATABASE IF NOT EXISTS test_db ENGINE = Atomic")
+        cur.execute("USE test_db")
+        cur.execute("DROP TABLE IF EXISTS batches")
+        cur.execute("""
+        CREATE TABLE batches (
+            id Int64,
+            name String
+        ) ENGINE = MergeTree ORDER BY id""")
+
+        # Force several statements to be generated
+        cur.max_stmt_length = 64
+        cur.executemany("INSERT INTO batches VALUES (%s, %s)",
+                        [(i, "a'%d" % i) for i in range(10)])
+        cur.executemany("INSERT INTO batches VALUES (%(id)s, %(name)s)",
+                        [{"id": i, "name": "b'%d" % i} for i in range(10, 20)])
+
+        cur.execute("SELECT id, name FROM batches ORDER BY id")
+        rows = cur.fetchall()
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0], (0, "a'0"))
+        self.assertEqual(rows[19], (19, "b'19"))
+
+        # A row that doesn't match the template must not be split into items
+        with self.assertRaises(TypeError):
+            cur.executemany("INSERT INTO batches VALUES (%s, %s)", [(20, "c"), "ab"])
+
+        cur.execute("DROP TABLE batches")
+        cur.close()
+        conn.close()
+
+    @unittest.skipUnless(has_numba, "numba is not installed")
+    def test_executemany_numba(self):
+        conn = dbapi.connect()
+        cur = conn.cursor()
+        cur.use_numba = True
+        cur.execute("CREATE DATABASE IF NOT EXISTS test_db ENGINE = Atomic")
+        cur.execute("USE test_db")
+        cur.execute("DROP TABLE IF EXISTS ints")
+        cur.execute("""
+        CREATE TABLE ints (
+            a Int64,
+            b Int64
+        ) ENGINE = MergeTree ORDER BY a""")
+
+        cur.max_stmt_length = 64
+        # A generator, with a row that isn't all integers at the end
+        rows = ((i, -i * 1000) for i in range(100))
+        cur.executemany("INSERT INTO ints VALUES (%s, %s)",
+                        itertools.chain(rows, [(100, 5.0)]))
+
+        cur.execute("SELECT count(), sum(a), sum(b) FROM ints")
+        self.assertEqual(cur.fetchone(), (101, 5050, -4949995))
+
+        cur.execute("DROP TABLE ints")
+        cur.close()
+        conn.close()
+
+    def test_mogrify_empty_args(self):
+        conn = dbapi.connect()
+        cur = conn.cursor()
+        # Empty args still process a literal %%
+        self.assertEqual(cur.mogrify("SELECT 100%%", ()), "SELECT 100%")
+        self.assertEqual(cur.mogrify("SELECT 100%%", {}), "SELECT 100%")
+        self.assertEqual(cur.mogrify("SELECT 1", ()), "SELECT 1")
+        self.assertEqual(cur.mogrify("SELECT %s", 0), "SELECT 0")
+        with self.assertRaises(TypeError):
+            cur.mogrify("SELECT '%s'", ())
+        self.assertEqual(cur.mogrify(b"SELECT 1", ()), b"SELECT 1")
+        self.assertEqual(cur.mogrify(b"SELECT 100%%", {}), b"SELECT 100%")
+
+        cur.execute(b"SELECT 1", ())
+        self.assertEqual(cur.fetchone(), (1,))
+
+        cur.execute("SELECT '100%%'", ())
+        self.assertEqual(cur.fetchone(), ("100%",))
+        cur.close()
+        conn.close()
+
+    def test_parse_insert(self):
+        # Runs on re2 when it's installed, must give the same results as re
+        cases = [
+            ("INSERT INTO t VALUES (%s, %s)",
+             (b"INSERT INTO t VALUES ", "(%s, %s)", b"")),
+            ("  insert into t (a, b) values(%(a)s,%(b)s) ;\n",
+             (b"insert into t (a, b) values", "(%(a)s,%(b)s)", b" ")),
+            ("INSERT INTO t VALUES (%s)\nON DUPLICATE KEY UPDATE a=1",
+             (b"INSERT INTO t VALUES ", "(%s)", b"\nON DUPLICATE KEY UPDATE a=1")),
+            ("REPLACE INTO t VALUE (%s)",
+             (b"REPLACE INTO t VALUE ", "(%s)", b"")),
+            ("INSERT INTO t\nVALUES\n(%s,\n %s)",
+             (b"INSERT INTO t\nVALUES\n", "(%s,\n %s)", b"")),
+            ("INSERT INTO t SELECT %s", None),
+            ("INSERT INTO t VALUES (%s), (%s)", None),
+            ("INSERT INTO t VALUES (%s) FORMAT", None),
+        ]
+        for query, expected in cases:
+            self.assertEqual(cursors._parse_insert(query, "utf8"), expected, query)
+
+    @unittest.skipUnless(has_re2, "google-re2 is not installed")
+    def test_parse_insert_uses_re2(self):
+        self.assertEqual(type(cursors.RE_INSERT_VALUES).__module__, "re2")
+
     def test_select_chdb_version(self):
         ver = dbapi.get_client_info()  # chDB version liek '0.12.0'
         ver_tuple = dbapi.chdb_version  # chDB version tuple like ('0', '12', '0')